@@ -7,8 +7,8 @@ Pinvirt
 Description:
   A Python utility to automate and manage CPU core assignments (pinning)
   for Virtual Machines (VMs) on Linux hosts. It retrieves the CPU topology
-  using 'lscpu', tracks VM-to-CPU mappings in a local JSON database,
-  and generates oVirt-compatible CPU pinning strings.
+  from sysfs (or 'lscpu' as a fallback), tracks VM-to-CPU mappings in a
+  local JSON database, and generates oVirt-compatible CPU pinning strings.
 
 Features:
   - Automatic or manual CPU allocation for VMs
@@ -19,7 +19,7 @@ Features:
 
 Requirements:
   - Python 3.x
-  - 'lscpu' command available on the system
+  - Linux sysfs, or the 'lscpu' command available on the system
 
 Usage:
   Run the script with the desired command:
@@ -35,18 +35,72 @@ License:
 """
 
 import argparse
+import functools
+import glob
+import heapq
 import json
 import logging
+import mmap
 import os
+import re
+import stat
 import subprocess
 import sys
+from array import array
+from collections import defaultdict
 from enum import IntEnum
-from typing import Dict, List, NamedTuple, Set, Tuple
+from itertools import chain, groupby, islice
+from operator import itemgetter
+from types import MappingProxyType
+from typing import (
+    AbstractSet,
+    Any,
+    Callable,
+    DefaultDict,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
 PinningMap = Dict[str, List[int]]
-CpuInfo = List[Tuple[int, int, int]]  # (logical_cpu, core_id, socket_id)
 
+# On-disk schema: {"<vm_name>": [<logical_cpu>, ...]}, where every CPU list
+# is sorted ascending and free of duplicates (enforced by save_pinning), so
+# readers never need to re-sort it.
 PINNING_FILE = "/etc/pinvirt/cpu_pinning_map.json"
+TOPOLOGY_CACHE_DIR = "/run/pinvirt"
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+SYSFS_CPU_DIR = "/sys/devices/system/cpu"
+SYSFS_NODE_DIR = "/sys/devices/system/node"
+
+HT_STRATEGIES = ("sequential", "interleave")
+
+# Sub-commands that modify PINNING_FILE and therefore require root.
+MUTATING_COMMANDS = ("add", "add-manual", "remove")
+# Sub-commands without arguments; a bare invocation bypasses argparse.
+SIMPLE_COMMANDS = ("list", "topology", "free-cpus")
+# Sub-commands that need the host CPU topology.
+TOPOLOGY_COMMANDS = ("add", "add-manual", "topology", "free-cpus")
+
+# Bump whenever the cached LogicalCpu layout changes.
+_TOPOLOGY_CACHE_VERSION = 4
+
+_MMAP_MIN_SIZE = 4096  # smaller pinning files are simply read()
+_UNKNOWN_DISTANCE = float("inf")  # NUMA pairs missing from the matrix sort last
+
+# cpuN entries of SYSFS_CPU_DIR (but not cpufreq, cpuidle, ...).
+_SYSFS_CPU_RE = re.compile(r"cpu(\d+)")
+
+# CPU,CORE,SOCKET,NODE,CACHE rows. NODE is empty on non-NUMA kernels.
+# Depending on the util-linux version, CACHE is "0:0:0:0" (L1d:L1i:L2:L3)
+# or ",0,0,0,0" (one column per cache level).
+_LSCPU_RE = re.compile(rb"(\d+),(\d+),(\d+),(\d*),([\d:,]*)$")
 
 
 class CpuAllocationError(RuntimeError):
@@ -56,38 +110,253 @@ class CpuAllocationError(RuntimeError):
 class Errno(IntEnum):
     NO_SOCKET = 1
     INSUFFICIENT_CORES = 2
+    NO_NUMA_NODE = 3
 
 
 class LogicalCpu(NamedTuple):
     logical_id: int
     core_id: int
     socket_id: int
+    llc_id: int = 0  # last-level cache (L3 on x86) shared by this CPU
+    numa_node: int = 0
+    die_id: int = 0  # die (chiplet/tile) within the socket
+
+
+class Topology:
+    """Host CPU topology stored as parallel ``array('i')`` columns (SoA).
+
+    Index ``i`` of every column describes the same logical CPU, so hot
+    loops can scan one packed column instead of dereferencing a tuple per
+    CPU. Iterating (or indexing) still yields :class:`LogicalCpu` views.
+    """
+
+    __slots__ = (
+        "logical_ids",
+        "core_ids",
+        "socket_ids",
+        "llc_ids",
+        "numa_nodes",
+        "die_ids",
+        "_cpu_set",
+    )
+
+    def __init__(
+        self,
+        logical_ids: Iterable[int] = (),
+        core_ids: Iterable[int] = (),
+        socket_ids: Iterable[int] = (),
+        llc_ids: Iterable[int] = (),
+        numa_nodes: Iterable[int] = (),
+        die_ids: Iterable[int] = (),
+    ) -> None:
+        self.logical_ids = array("i", logical_ids)
+        self.core_ids = array("i", core_ids)
+        self.socket_ids = array("i", socket_ids)
+        self.llc_ids = array("i", llc_ids)
+        self.numa_nodes = array("i", numa_nodes)
+        self.die_ids = array("i", die_ids)
+        self._cpu_set = None
+
+    @classmethod
+    def from_cpus(cls, cpus: Iterable[LogicalCpu]) -> "Topology":
+        """Builds a topology from :class:`LogicalCpu` records."""
+        if isinstance(cpus, cls):
+            return cpus
+        return cls(*zip(*(LogicalCpu(*cpu) for cpu in cpus)))
+
+    def cpu_set(self) -> FrozenSet[int]:
+        """Returns all logical CPU ids as a frozenset, built once."""
+        if self._cpu_set is None:
+            self._cpu_set = frozenset(self.logical_ids)
+        return self._cpu_set
+
+    def __len__(self) -> int:
+        return len(self.logical_ids)
+
+    def __iter__(self) -> Iterator[LogicalCpu]:
+        return map(
+            LogicalCpu,
+            self.logical_ids,
+            self.core_ids,
+            self.socket_ids,
+            self.llc_ids,
+            self.numa_nodes,
+            self.die_ids,
+        )
+
+    def __getitem__(self, index: int) -> LogicalCpu:
+        return LogicalCpu(
+            self.logical_ids[index],
+            self.core_ids[index],
+            self.socket_ids[index],
+            self.llc_ids[index],
+            self.numa_nodes[index],
+            self.die_ids[index],
+        )
+
+    def __repr__(self) -> str:
+        return f"Topology({list(self)!r})"
+
+
+CpuInfo = Topology
+
+
+# Optional, much faster JSON backend, set by _import_orjson() on first use.
+orjson: Any = None
+
+
+def _import_orjson() -> Any:
+    """Imports orjson on first use; returns ``None`` if it is not installed.
+
+    Importing orjson takes longer than stdlib ``json`` needs for a typical
+    pinning map, so it is only loaded for payloads above ``_MMAP_MIN_SIZE``.
+    """
+    global orjson
+    if orjson is None:
+        try:
+            import orjson as module
+        except ImportError:  # pragma: no cover - depends on the host
+            return None
+        orjson = module
+    return orjson
+
+
+def _json_loads(raw: bytes) -> Any:
+    """Parses JSON from *raw* bytes, using orjson for large payloads."""
+    if len(raw) > _MMAP_MIN_SIZE and _import_orjson() is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode())
+
+
+def _json_dumps(data: Any) -> bytes:
+    """Serializes *data* as indented JSON bytes.
+
+    The output size is not known up front, so orjson is only used when a
+    large payload has already imported it. Keys are sorted so the output
+    is stable whichever backend wrote it.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    return json.dumps(data, indent=2, sort_keys=True).encode()
+
+
+# (st_ino, st_mtime_ns, st_size) of PINNING_FILE, or None if it is missing.
+_FileKey = Optional[Tuple[int, int, int]]
+
+# File key -> parsed read-only map, see load_pinning().
+_PINNING_CACHE: Optional[Tuple[_FileKey, Mapping[str, List[int]]]] = None
+
+
+def _pinning_file_key() -> _FileKey:
+    """Identifies the current version of PINNING_FILE (``None`` if missing).
+
+    ``save_pinning`` replaces the file, so the inode changes on every
+    write even when the mtime granularity is coarse.
+    """
+    try:
+        st = os.stat(PINNING_FILE)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def load_pinning() -> Mapping[str, List[int]]:
+    """Loads the CPU pinning data from the local JSON file.
+
+    The result is memoized and returned as a read-only view; callers that
+    need to modify it must work on a ``dict(...)`` copy. The file is only
+    parsed again once it changes on disk (e.g. another ``pinvirt`` run
+    saved it), which is detected with a single ``stat()``.
+    """
+    global _PINNING_CACHE
+    key = _pinning_file_key()
+    if _PINNING_CACHE is not None and _PINNING_CACHE[0] == key:
+        return _PINNING_CACHE[1]
+    data = MappingProxyType(_read_pinning_file())
+    _PINNING_CACHE = (key, data)
+    return data
+
+
+def _clear_pinning_cache() -> None:
+    """Forgets the memoized pinning map."""
+    global _PINNING_CACHE
+    _PINNING_CACHE = None
 
 
-def load_pinning() -> PinningMap:
-    """Loads the CPU pinning data from the local JSON file."""
+def _read_pinning_file() -> PinningMap:
+    """Reads and parses PINNING_FILE, returning an empty map on failure."""
     if not os.path.exists(PINNING_FILE):
         return {}
     try:
-        with open(PINNING_FILE) as file:
-            return json.load(file)
-    except json.JSONDecodeError:
+        with open(PINNING_FILE, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:  # e.g. freshly created; nothing pinned yet
+                return {}
+            if size > _MMAP_MIN_SIZE and _import_orjson() is not None:
+                # orjson parses straight from the page cache; no bytes copy.
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    with memoryview(mapped) as view:
+                        data = orjson.loads(view)
+            else:
+                data = _json_loads(file.read())
+    except ValueError:  # json/orjson JSONDecodeError, bad UTF-8
+        data = None
+    except OSError as e:
         logging.error(
-            "Invalid JSON format in %s. Assuming empty pinning data.", PINNING_FILE
+            "Failed to read %s: %s. Assuming empty pinning data.", PINNING_FILE, e
         )
         return {}
-    except OSError as e:
+    if not isinstance(data, dict):  # also valid JSON such as [] or null
         logging.error(
-            "Failed to read %s: %s. Assuming empty pinning data.", PINNING_FILE, e
+            "Invalid JSON format in %s. Assuming empty pinning data.", PINNING_FILE
         )
         return {}
+    return data
+
+
+def _atomic_write(path: str, payload: bytes) -> None:
+    """Replaces *path* with *payload* atomically.
+
+    The data goes to a temporary file in the same directory, is fsync'ed,
+    and is then renamed over *path*, so readers (or a crash) only ever see
+    the old or the new content, never a truncated file. An existing *path*
+    keeps its permission bits; a new one is created with mode 0644.
+    """
+    import tempfile  # only writers need it; it pulls in random/hashlib
+
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".",
+        prefix="." + os.path.basename(path) + ".",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(fd, "wb") as file:
+            os.fchmod(file.fileno(), mode)
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
 
 
 def save_pinning(data: PinningMap) -> None:
-    """Saves the current CPU pinning data to the local JSON file."""
+    """Saves the current CPU pinning data to the local JSON file.
+
+    Each CPU list is sorted and deduplicated once here, at write time.
+    """
+    data = {vm_name: sorted(set(cpus)) for vm_name, cpus in data.items()}
     try:
-        with open(PINNING_FILE, "w") as file:
-            json.dump(data, file, indent=2)
+        _atomic_write(PINNING_FILE, _json_dumps(data))
+        _clear_pinning_cache()
     except OSError as e:
         logging.error(
             "Failed to write pinning data to %s: %s", PINNING_FILE, e
@@ -95,66 +364,393 @@ def save_pinning(data: PinningMap) -> None:
         sys.exit(1)
 
 
+def _topology_cache_path() -> Optional[str]:
+    """Returns the topology cache file for the current boot, if it is known.
+
+    The cache is keyed by the kernel boot id and lives on ``/run`` (tmpfs),
+    which is wiped on every boot anyway.  CPU hotplug within a boot is
+    caught by the online CPU list stored in the cache itself.
+    """
+    try:
+        with open(BOOT_ID_FILE) as file:
+            boot_id = file.read().strip()
+    except OSError:
+        return None
+    if not boot_id:
+        return None
+    return os.path.join(TOPOLOGY_CACHE_DIR, f"topology.{boot_id}.json")
+
+
+def _read_online_cpu_list() -> Optional[str]:
+    """Returns the raw sysfs online CPU list, or ``None`` if it is missing."""
+    try:
+        with open(os.path.join(SYSFS_CPU_DIR, "online")) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def _load_topology_cache(path: str, online: Optional[str]) -> Optional[CpuInfo]:
+    """Loads the cached topology, or ``None`` if missing, stale or unreadable.
+
+    A cache written while a different set of CPUs was *online* is stale.
+    """
+    try:
+        with open(path, "rb") as file:
+            cache = _json_loads(file.read())
+        if cache.get("version") != _TOPOLOGY_CACHE_VERSION:
+            return None
+        if cache.get("online") != online:
+            return None
+        return Topology.from_cpus(cache["topology"])
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def _save_topology_cache(path: str, topology: CpuInfo, online: Optional[str]) -> None:
+    """Atomically stores the parsed topology; failures are not fatal."""
+    payload = _json_dumps(
+        {
+            "version": _TOPOLOGY_CACHE_VERSION,
+            "online": online,
+            "topology": [list(cpu) for cpu in topology],
+        }
+    )
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _atomic_write(path, payload)
+    except OSError as e:
+        logging.debug("Failed to write topology cache %s: %s", path, e)
+
+
+@functools.lru_cache(maxsize=1)
 def get_cpu_topology() -> CpuInfo:
-    """Retrieves the CPU topology of the host system using `lscpu`."""
+    """Retrieves the CPU topology of the host system.
+
+    The topology is read from sysfs, falling back to `lscpu` when sysfs is
+    not available. The parsed result is cached under ``TOPOLOGY_CACHE_DIR``
+    for the rest of the current boot, or until CPUs are hot(un)plugged
+    (see ``_topology_cache_path``).
+    The result is also memoized for the lifetime of the process and must
+    not be mutated by callers.
+    """
+    cache_path = _topology_cache_path()
+    online = _read_online_cpu_list()
+    if cache_path is not None:
+        cached = _load_topology_cache(cache_path, online)
+        if cached:
+            return cached
+
+    topology = Topology.from_cpus(_read_sysfs_topology() or _read_lscpu_topology())
+    if cache_path is not None:
+        _save_topology_cache(cache_path, topology, online)
+    return topology
+
+
+def _read_int(path: str) -> int:
+    with open(path) as file:
+        return int(file.read())
+
+
+def _sysfs_llc_index() -> Optional[str]:
+    """Returns the sysfs cache directory of the last-level cache (``indexN``)."""
+    indexes = glob.glob(os.path.join(SYSFS_CPU_DIR, "cpu0", "cache", "index[0-9]*"))
+    if not indexes:
+        return None
+    return max((os.path.basename(p) for p in indexes), key=lambda n: int(n[5:]))
+
+
+def _read_sysfs_llc_id(cpu_dir: str, llc_index: Optional[str], default: int) -> int:
+    """Reads the LLC id of a CPU, falling back to *default* (its socket)."""
+    if llc_index is None:
+        return default
+    cache_dir = os.path.join(cpu_dir, "cache", llc_index)
+    try:
+        return _read_int(os.path.join(cache_dir, "id"))
+    except FileNotFoundError:  # older kernels: use the first sharing CPU
+        pass
+    try:
+        with open(os.path.join(cache_dir, "shared_cpu_list")) as file:
+            return int(re.split(r"[,-]", file.read(), maxsplit=1)[0])
+    except FileNotFoundError:
+        return default
+
+
+def _parse_cpu_list(text: str) -> List[int]:
+    """Expands a kernel CPU list such as ``"0-3,8,10-11"``."""
+    cpus: List[int] = []
+    for chunk in text.strip().split(","):
+        if not chunk:
+            continue
+        first, _, last = chunk.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def _read_sysfs_numa_nodes() -> Dict[int, int]:
+    """Maps logical CPU -> NUMA node; empty if the kernel exposes no nodes."""
+    cpu_node: Dict[int, int] = {}
+    for path in glob.glob(os.path.join(SYSFS_NODE_DIR, "node[0-9]*")):
+        node = int(path.rsplit("node", 1)[1])
+        with open(os.path.join(path, "cpulist")) as file:
+            for cpu in _parse_cpu_list(file.read()):
+                cpu_node[cpu] = node
+    return cpu_node
+
+
+@functools.lru_cache(maxsize=1)
+def get_numa_distances() -> Mapping[int, Mapping[int, int]]:
+    """Reads the NUMA distance matrix (node -> node -> distance) from sysfs.
+
+    Each ``nodeN/distance`` row lists the distances to every online node in
+    ascending node order.  An empty mapping is returned when the kernel
+    exposes no nodes or the files cannot be parsed.
+    """
+    paths = glob.glob(os.path.join(SYSFS_NODE_DIR, "node[0-9]*"))
+    nodes = sorted(int(path.rsplit("node", 1)[1]) for path in paths)
+    distances: Dict[int, Mapping[int, int]] = {}
     try:
-        output = subprocess.check_output(
-            ["lscpu", "-p=CPU,CORE,SOCKET"], universal_newlines=True
+        for node in nodes:
+            path = os.path.join(SYSFS_NODE_DIR, f"node{node}", "distance")
+            with open(path) as file:
+                row = [int(value) for value in file.read().split()]
+            distances[node] = MappingProxyType(dict(zip(nodes, row)))
+    except (OSError, ValueError) as e:
+        logging.debug("NUMA distances unavailable (%s).", e)
+        return MappingProxyType({})
+    return MappingProxyType(distances)
+
+
+def _socket_distances(
+    topology: "Topology",
+    target_socket: int,
+    numa_distances: Mapping[int, Mapping[int, int]],
+) -> Dict[int, float]:
+    """Distance from *target_socket* to every socket, via their NUMA nodes.
+
+    Sockets whose distance is missing from *numa_distances* get
+    ``_UNKNOWN_DISTANCE``, so they are drained last.
+    """
+    socket_nodes: DefaultDict[int, set] = defaultdict(set)
+    for socket_id, node in zip(topology.socket_ids, topology.numa_nodes):
+        socket_nodes[socket_id].add(node)
+    home_nodes = socket_nodes[target_socket]
+    return {
+        socket_id: min(
+            numa_distances.get(home, {}).get(node, _UNKNOWN_DISTANCE)
+            for home in home_nodes
+            for node in nodes
         )
+        for socket_id, nodes in socket_nodes.items()
+    }
+
+
+def _sysfs_online_cpus() -> List[int]:
+    """Lists the online logical CPUs.
+
+    ``cpu/online`` is read when the kernel provides it; otherwise every
+    ``cpuN`` directory is listed and offline ones are skipped later on.
+    """
+    try:
+        with open(os.path.join(SYSFS_CPU_DIR, "online")) as file:
+            return _parse_cpu_list(file.read())
+    except FileNotFoundError:
+        pass
+    with os.scandir(SYSFS_CPU_DIR) as entries:
+        matches = (_SYSFS_CPU_RE.fullmatch(entry.name) for entry in entries)
+        return [int(match.group(1)) for match in matches if match]
+
+
+def _read_sysfs_topology() -> Optional[List[LogicalCpu]]:
+    """Reads the CPU topology from sysfs, or ``None`` if it is unavailable."""
+    topology: List[LogicalCpu] = []
+    try:
+        llc_index = _sysfs_llc_index()
+        cpu_node = _read_sysfs_numa_nodes()
+        for logical_cpu in _sysfs_online_cpus():
+            path = os.path.join(SYSFS_CPU_DIR, f"cpu{logical_cpu}")
+            try:
+                core_id = _read_int(os.path.join(path, "topology", "core_id"))
+                socket_id = _read_int(
+                    os.path.join(path, "topology", "physical_package_id")
+                )
+            except FileNotFoundError:  # offline CPUs expose no topology
+                continue
+            llc_id = _read_sysfs_llc_id(path, llc_index, socket_id)
+            try:
+                die_id = _read_int(os.path.join(path, "topology", "die_id"))
+            except FileNotFoundError:  # kernels < 5.2: one die per socket
+                die_id = 0
+            topology.append(
+                LogicalCpu(
+                    logical_cpu,
+                    core_id,
+                    socket_id,
+                    llc_id,
+                    cpu_node.get(logical_cpu, 0),
+                    die_id,
+                )
+            )
+    except (OSError, ValueError) as e:
+        logging.debug("Failed to read CPU topology from sysfs: %s", e)
+        return None
+
+    topology.sort()
+    return topology or None
+
+
+def _read_lscpu_topology() -> List[LogicalCpu]:
+    """Parses the CPU topology from the output of `lscpu`."""
+    # Comment lines and malformed rows simply do not match. Rows are keyed
+    # by logical CPU, so a repeated row is dropped for free, and are parsed
+    # as they are streamed instead of buffering the output.
+    rows: Dict[int, Tuple[bytes, ...]] = {}
+    try:
+        with subprocess.Popen(
+            ["lscpu", "-p=CPU,CORE,SOCKET,NODE,CACHE"], stdout=subprocess.PIPE
+        ) as proc:
+            matches = filter(None, map(_LSCPU_RE.match, proc.stdout))
+            rows = {int(match.group(1)): match.groups() for match in matches}
     except FileNotFoundError:
         logging.error(
             "Failed to run `lscpu`: command not found. Ensure it's installed."
         )
         sys.exit(1)
-    except subprocess.SubprocessError as e:
+    except (OSError, subprocess.SubprocessError) as e:
         logging.error(
             "Failed to run `lscpu`: %s. Ensure it's installed and accessible.",
             e,
         )
         sys.exit(1)
 
-    topology: CpuInfo = []
-    parsed_cpus = set()
-
-    for line in output.splitlines():
-        if line.startswith("#"):
-            continue
-        parts = line.strip().split(",")
-        if len(parts) == 3:
-            try:
-                logical_cpu, core_id, socket_id = map(int, parts)
-                if logical_cpu not in parsed_cpus:  # evita duplicati
-                    topology.append(LogicalCpu(logical_cpu, core_id, socket_id))
-                    parsed_cpus.add(logical_cpu)
-            except ValueError:
-                logging.warning(
-                    "Skipping invalid line in lscpu output: %s", line
-                )
+    if proc.returncode != 0:
+        logging.error(
+            "Failed to run `lscpu`: exit status %s. Ensure it's installed and "
+            "accessible.",
+            proc.returncode,
+        )
+        sys.exit(1)
 
-    if not topology:
+    if not rows:
         logging.error(
             "No valid CPU topology information found in lscpu output."
         )
         sys.exit(1)
 
-    return topology
+    # The LLC is the last CACHE level; without cache data the socket stands
+    # in for it.
+    return [
+        LogicalCpu(
+            cpu,
+            int(core),
+            int(socket),
+            int(re.split(rb"[:,]", caches)[-1] or socket),
+            int(node or 0),
+        )
+        for cpu, (_, core, socket, node, caches) in rows.items()
+    ]
+
+
+def get_used_logical_cpus(pinning_data: PinningMap) -> FrozenSet[int]:
+    """Extracts the set of all logical CPUs currently assigned to VMs.
+
+    The result is immutable, so it can be shared between callers safely.
+    """
+    return frozenset(chain.from_iterable(pinning_data.values()))
+
+
+def _group_free_cores(
+    topology: Topology, used_cpus: AbstractSet[int], only_socket: Optional[int]
+) -> Tuple[Dict[Tuple[int, int], List[int]], Dict[Tuple[int, int], int]]:
+    """Groups the free logical CPUs of *topology* by physical core.
+
+    Returns ``{(socket_id, core_id): sorted logical ids}`` together with the
+    index of one CPU of each core, used to look up its LLC and NUMA node.
+    CPUs in *used_cpus*, or outside *only_socket* when it is given, are
+    skipped.
+    """
+    logical_ids = topology.logical_ids
+    core_ids = topology.core_ids
+    socket_ids = topology.socket_ids
+
+    available_cores: DefaultDict[Tuple[int, int], List[int]] = defaultdict(list)
+    first_index: Dict[Tuple[int, int], int] = {}
 
+    for i in range(len(topology)):
+        logical_id = logical_ids[i]
+        if logical_id in used_cpus:
+            continue
+        socket_id = socket_ids[i]
+        if only_socket is not None and socket_id != only_socket:
+            continue
+
+        key = (socket_id, core_ids[i])
+        available_cores[key].append(logical_id)
+        first_index.setdefault(key, i)
+
+    for ids in available_cores.values():
+        ids.sort()
 
-def get_used_logical_cpus(pinning_data: PinningMap) -> Set[int]:
-    """Extracts the set of all logical CPUs currently assigned to VMs."""
-    used: Set[int] = set()
-    for cpu_list in pinning_data.values():
-        used.update(cpu_list)
-    return used
+    return available_cores, first_index
+
+
+def _pack_by_llc(
+    core_groups: List[Tuple[Tuple[int, int], List[int]]],
+    core_llc: Dict[Tuple[int, int], int],
+    core_die: Dict[Tuple[int, int], int],
+    num_vcpus: int,
+    use_hyperthreads: bool,
+    preference: Callable[[Tuple[int, int]], Tuple[bool, ...]],
+) -> List[Tuple[Tuple[int, int], List[int]]]:
+    """Reorders free cores so that a VM spans as few last-level caches as possible.
+
+    Cores are still ordered by *preference* (preferred NUMA node/socket
+    first). Within that, LLC domains that can hold the whole VM are used
+    first (the smallest such domain, i.e. best fit). If no single LLC is
+    big enough, the VM is kept on one die (chiplet/tile) when possible,
+    picking dies the same best-fit way, and each die is filled from its
+    largest LLC down.
+    """
+    llc_free: DefaultDict[Tuple[int, int], int] = defaultdict(int)
+    die_free: DefaultDict[Tuple[int, int], int] = defaultdict(int)
+    for key, cpus in core_groups:
+        threads = len(cpus) if use_hyperthreads else 1
+        llc_free[(key[0], core_llc[key])] += threads
+        die_free[(key[0], core_die[key])] += threads
+
+    def llc_sort_key(item):
+        key, _ = item
+        socket_id, core_id = key
+        llc = (socket_id, core_llc[key])
+        if llc_free[llc] >= num_vcpus:
+            return (preference(key), 0, llc_free[llc], llc, core_id)
+        die = (socket_id, core_die[key])
+        die_fits = die_free[die] >= num_vcpus
+        return (
+            preference(key),
+            1,
+            0 if die_fits else 1,
+            die_free[die] if die_fits else -die_free[die],
+            die,
+            -llc_free[llc],
+            llc,
+            core_id,
+        )
+
+    return sorted(core_groups, key=llc_sort_key)
 
 
 def generate_cpu_allocation(
     cpu_topology,  # Iterable[LogicalCpu]
     num_vcpus,  # int
-    used_cpus,  # Set[int]
+    used_cpus,  # AbstractSet[int]
     target_socket=None,  # Optional[int]
     allow_multi_socket=False,  # bool
     use_hyperthreads=False,  # bool
+    pack_llc=False,  # bool
+    target_numa_node=None,  # Optional[int]
+    ht_strategy="sequential",  # str, one of HT_STRATEGIES
+    numa_distances=None,  # Optional[Mapping[int, Mapping[int, int]]]
 ):
     """
     Allocate logical CPUs for *vCPU pinning*.
@@ -165,12 +761,12 @@ def generate_cpu_allocation(
 
     Parameters
     ----------
-    cpu_topology : Iterable[LogicalCpu]
-        Sequence of :class:`LogicalCpu` records describing the host’s
-        *(logical-id, core-id, socket-id)* layout.
+    cpu_topology : Topology or Iterable[LogicalCpu]
+        The host’s *(logical-id, core-id, socket-id, …)* layout, either as a
+        :class:`Topology` or as a sequence of :class:`LogicalCpu` records.
     num_vcpus : int
         Number of vCPUs to allocate for the new VM (must be > 0).
-    used_cpus : Set[int]
+    used_cpus : AbstractSet[int]
         Logical CPU IDs that are already assigned to other VMs – they are
         excluded from the search space.
     target_socket : int, optional
@@ -188,6 +784,28 @@ def generate_cpu_allocation(
         * ``False`` – take **one** logical thread per core (original behaviour).
         * ``True``  – exhaust *all* hyper-threads of a core before moving on,
           which keeps vCPUs on as few physical cores as possible.
+    pack_llc : bool, default ``False``
+        If *True*, keep the vCPUs inside as few last-level caches (L3/CCX)
+        as possible, preferring a single LLC that can hold the whole VM,
+        then a single die. Otherwise cores are taken in plain
+        *(socket, core)* order.
+    target_numa_node : int, optional
+        NUMA node to prefer, ahead of the rest of *target_socket*, so that
+        vCPUs stay close to the VM's memory.  It only reorders candidates;
+        use *target_socket* / *allow_multi_socket* to restrict them.
+    ht_strategy : str, default ``"sequential"``
+        How threads are taken when *use_hyperthreads* is *True*:
+
+        * ``"sequential"`` – fill all siblings of a core before the next one.
+        * ``"interleave"`` – take one thread of every core first, then
+          their siblings, round-robin.  This is done per socket / NUMA
+          node / LLC group, in preference order, so locality is kept.
+    numa_distances : Mapping[int, Mapping[int, int]], optional
+        NUMA distance matrix, as returned by :func:`get_numa_distances`.
+        When given, cores outside *target_numa_node* are taken from the
+        nearest nodes first, and with *allow_multi_socket* the other
+        sockets are drained in order of distance from *target_socket*
+        rather than by socket id.
 
     Returns
     -------
@@ -200,8 +818,12 @@ def generate_cpu_allocation(
         Raised with:
 
         * ``Errno.NO_SOCKET`` if *target_socket* does not exist.
+        * ``Errno.NO_NUMA_NODE`` if *target_numa_node* does not exist, or
+          has no CPUs on *target_socket* and *allow_multi_socket* is False.
         * ``Errno.INSUFFICIENT_CORES`` when the host lacks enough free
           physical/logical CPUs given the current strategy.
+    ValueError
+        If *ht_strategy* is not one of ``HT_STRATEGIES``.
 
     Notes
     -----
@@ -211,7 +833,14 @@ def generate_cpu_allocation(
     hypervisor/manager (oVirt, libvirt, etc.).
     """
 
-    available_sockets = {cpu.socket_id for cpu in cpu_topology}
+    if ht_strategy not in HT_STRATEGIES:
+        raise ValueError(
+            "ht_strategy must be one of {}, not {!r}".format(HT_STRATEGIES, ht_strategy)
+        )
+
+    topology = Topology.from_cpus(cpu_topology)
+
+    available_sockets = set(topology.socket_ids)
     if (target_socket is not None) and (target_socket not in available_sockets):
         logging.error(
             "Socket %s not found. Available: %s",
@@ -220,43 +849,115 @@ def generate_cpu_allocation(
         )
         raise CpuAllocationError(Errno.NO_SOCKET)
 
-    available_cores = {}  # type: Dict[Tuple[int, int], List[int]]
-
-    for cpu in cpu_topology:
-        if cpu.logical_id in used_cpus:
-            continue
-        if (
-            target_socket is not None
-            and not allow_multi_socket
-            and cpu.socket_id != target_socket
-        ):
-            continue
-
-        key = (cpu.socket_id, cpu.core_id)
-        available_cores.setdefault(key, []).append(cpu.logical_id)
-
-    for ids in available_cores.values():
-        ids.sort()
+    if target_numa_node is not None:
+        available_nodes = set(topology.numa_nodes)
+        if target_numa_node not in available_nodes:
+            logging.error(
+                "NUMA node %s not found. Available: %s",
+                target_numa_node,
+                sorted(available_nodes),
+            )
+            raise CpuAllocationError(Errno.NO_NUMA_NODE)
+
+    only_socket = None if allow_multi_socket else target_socket
+    if target_numa_node is not None and only_socket is not None:
+        # Without allow_multi_socket only *only_socket* is searched, so a
+        # node living elsewhere could never be preferred.
+        node_sockets = {
+            socket_id
+            for socket_id, node in zip(topology.socket_ids, topology.numa_nodes)
+            if node == target_numa_node
+        }
+        if only_socket not in node_sockets:
+            logging.error(
+                "NUMA node %s has no CPUs on socket %s (found on socket(s) %s). "
+                "Pick a matching socket or use --multi-socket.",
+                target_numa_node,
+                only_socket,
+                sorted(node_sockets),
+            )
+            raise CpuAllocationError(Errno.NO_NUMA_NODE)
+    available_cores, first_index = _group_free_cores(topology, used_cpus, only_socket)
+
+    core_llc: Dict[Tuple[int, int], int] = {}
+    core_die: Dict[Tuple[int, int], int] = {}
+    core_node: Dict[Tuple[int, int], int] = {}
+    if pack_llc:
+        llc_ids = topology.llc_ids
+        die_ids = topology.die_ids
+        core_llc = {key: llc_ids[i] for key, i in first_index.items()}
+        core_die = {key: die_ids[i] for key, i in first_index.items()}
+    if target_numa_node is not None:
+        numa_nodes = topology.numa_nodes
+        core_node = {key: numa_nodes[i] for key, i in first_index.items()}
+
+    node_distance: Mapping[int, int] = {}
+    socket_distance: Dict[int, float] = {}
+    if numa_distances:
+        if target_numa_node is not None:
+            node_distance = numa_distances.get(target_numa_node, {})
+        if target_socket is not None and allow_multi_socket:
+            socket_distance = _socket_distances(
+                topology, target_socket, numa_distances
+            )
 
-    def core_sort_key(item):
-        (socket_id, core_id), _ = item
-        preferred = target_socket is not None and socket_id == target_socket
-        return (0 if preferred else 1, socket_id, core_id)
+    def preference(key):  # lower sorts first
+        return (
+            target_numa_node is not None and core_node[key] != target_numa_node,
+            target_socket is not None and key[0] != target_socket,
+            node_distance.get(core_node[key], _UNKNOWN_DISTANCE)
+            if node_distance
+            else 0,
+            socket_distance.get(key[0], 0),
+        )
 
-    sorted_core_groups = sorted(available_cores.items(), key=core_sort_key)
+    # Cores on the preferred NUMA node / socket go first, then the nearest
+    # ones; within each partition the default tuple ordering sorts by
+    # (socket_id, core_id).
+    if not use_hyperthreads and not pack_llc:
+        # Only one thread of the best ``num_vcpus`` cores is used, so pick
+        # them with a bounded heap instead of sorting every free core.
+        sorted_core_groups = heapq.nsmallest(
+            num_vcpus,
+            available_cores.items(),
+            key=lambda item: (preference(item[0]), item[0]),
+        )
+    elif target_numa_node is not None:
+        sorted_core_groups = sorted(
+            available_cores.items(), key=lambda item: (preference(item[0]), item[0])
+        )
+    elif target_socket is None:
+        sorted_core_groups = sorted(available_cores.items())
+    else:
+        preferred, others = [], []
+        for item in available_cores.items():
+            (preferred if item[0][0] == target_socket else others).append(item)
+        others.sort(key=lambda item: (socket_distance.get(item[0][0], 0), item[0]))
+        sorted_core_groups = sorted(preferred) + others
+
+    if pack_llc:
+        sorted_core_groups = _pack_by_llc(
+            sorted_core_groups,
+            core_llc,
+            core_die,
+            num_vcpus,
+            use_hyperthreads,
+            preference,
+        )
 
     assigned = []  # type: List[int]
 
     if not use_hyperthreads:
-        single_threads = [cpus[0] for _, cpus in sorted_core_groups]
-        if len(single_threads) < num_vcpus:
+        # Only the first ``num_vcpus`` cores are ever needed; if fewer come
+        # back, every free core has been taken and the count is exact.
+        assigned = [cpus[0] for _, cpus in islice(sorted_core_groups, num_vcpus)]
+        if len(assigned) < num_vcpus:
             logging.error(
                 "Insufficient physical cores: required %s, available %s",
                 num_vcpus,
-                len(single_threads),
+                len(assigned),
             )
             raise CpuAllocationError(Errno.INSUFFICIENT_CORES)
-        assigned = single_threads[:num_vcpus]
     else:
         total_logical = sum(len(cpus) for cpus in available_cores.values())
         if total_logical < num_vcpus:
@@ -267,43 +968,73 @@ def generate_cpu_allocation(
             )
             raise CpuAllocationError(Errno.INSUFFICIENT_CORES)
 
-        for _, cpus in sorted_core_groups:
-            need = num_vcpus - len(assigned)
-            if need <= 0:
-                break
-            assigned.extend(cpus[:need])
+        if ht_strategy == "interleave":
+            # Interleave within each (socket, NUMA node, LLC) group and fill
+            # the groups in preference order, so spreading threads over
+            # cores never pulls vCPUs off a socket / node / cache with room.
+            def locality(item):
+                key = item[0]
+                return key[0], core_node.get(key), core_llc.get(key)
+
+            def interleaved(group):
+                cores = [cpus for _, cpus in group]
+                depth = max(map(len, cores))
+                return (
+                    cpus[rank]
+                    for rank in range(depth)
+                    for cpus in cores
+                    if rank < len(cpus)
+                )
+
+            threads = chain.from_iterable(
+                interleaved(group)
+                for _, group in groupby(sorted_core_groups, key=locality)
+            )
+            assigned = list(islice(threads, num_vcpus))
+        else:
+            threads = chain.from_iterable(cpus for _, cpus in sorted_core_groups)
+            assigned = list(islice(threads, num_vcpus))
 
     return sorted(assigned)
 
 
-def build_ovirt_pinning_string(assigned_cpus: List[int]) -> str:
-    """Formats a list of logical CPUs into a pinning string compatible with oVirt."""
-    # Ensure input is sorted for consistent oVirt string if order doesn't matter
-    sorted_cpus = sorted(assigned_cpus)
-    return "_".join(f"{v_cpu}#{p_cpu}" for v_cpu, p_cpu in enumerate(sorted_cpus))
+def build_ovirt_pinning_string(sorted_cpus: List[int]) -> str:
+    """Formats a list of logical CPUs into a pinning string compatible with oVirt.
 
+    *sorted_cpus* must already be sorted ascending: vCPU ``n`` is pinned to
+    the ``n``-th entry as given.
+    """
+    return _ovirt_string(tuple(sorted_cpus))
 
-def list_vms(pinning_data: PinningMap) -> None:
-    print("\n📋 Currently pinned VMs:")
-    if not pinning_data:
-        print("  (none)")
-        return
 
-    for vm_name, cpus in sorted(pinning_data.items()):
-        # Ensure CPUs are sorted before generating the string for consistency
-        sorted_cpus = sorted(cpus)
-        ovirt_string: str = build_ovirt_pinning_string(sorted_cpus)
-        print(f"  🖥️  {vm_name}")
-        print(f"      • CPUs assigned  : {sorted_cpus}")
-        print(f"      • oVirt pinning  : {ovirt_string}")
-    print()
+@functools.lru_cache(maxsize=512)
+def _ovirt_string(sorted_cpus: Tuple[int, ...]) -> str:
+    """Memoized body of :func:`build_ovirt_pinning_string`."""
+    return "_".join(["%d#%d" % pair for pair in enumerate(sorted_cpus)])
 
 
-def list_available_cpus(cpu_topology: CpuInfo, used_cpus: Set[int]) -> None:
-    all_logical_cpus: Set[int] = {cpu for cpu, _, _ in cpu_topology}
-    available: List[int] = sorted(list(all_logical_cpus - used_cpus))
-    print(f"\n🧠 Available logical CPUs ({len(available)}):")
-    print(f"  {available}\n")
+def list_vms(pinning_data: PinningMap) -> None:
+    buf: List[str] = ["\n📋 Currently pinned VMs:\n"]
+    append = buf.append
+    if not pinning_data:
+        append("  (none)\n")
+    else:
+        # CPU lists are stored sorted (see save_pinning), so use them as-is.
+        for vm_name, cpus in sorted(pinning_data.items()):
+            ovirt_string: str = build_ovirt_pinning_string(cpus)
+            append(f"  🖥️  {vm_name}\n")
+            append(f"      • CPUs assigned  : {cpus}\n")
+            append(f"      • oVirt pinning  : {ovirt_string}\n")
+        append("\n")
+    sys.stdout.write("".join(buf))
+
+
+def list_available_cpus(cpu_topology: CpuInfo, used_cpus: AbstractSet[int]) -> None:
+    all_logical_cpus = Topology.from_cpus(cpu_topology).cpu_set()
+    available: List[int] = sorted(all_logical_cpus - used_cpus)
+    sys.stdout.write(
+        f"\n🧠 Available logical CPUs ({len(available)}):\n  {available}\n\n"
+    )
 
 
 def remove_vm(vm_name: str, pinning_data: PinningMap) -> None:
@@ -315,36 +1046,33 @@ def remove_vm(vm_name: str, pinning_data: PinningMap) -> None:
     print(f"[INFO] Removed pinning entry for VM '{vm_name}'.")
 
 
-def print_cpu_topology(cpu_topology: CpuInfo, used_cpus: Set[int]) -> None:
-    print("\n Host CPU Topology (Logical CPUs per Physical Core)")
-    print(
-        " Status: ✅ = Core fully available | ❌ = Core partially/fully used | * = CPU assigned"
-    )
-    print("-------------------------------------------------------------")
-
-    topology_map: Dict[int, Dict[int, List[int]]] = {}
-    all_logical_cpus: Set[int] = set()
-
-    for logical_cpu, core_id, socket_id in cpu_topology:
-        topology_map.setdefault(socket_id, {}).setdefault(core_id, []).append(
-            logical_cpu
-        )
-        all_logical_cpus.add(logical_cpu)
-
-    for socket_id in sorted(topology_map):
-        print(f"Socket {socket_id}:")
-        for core_id in sorted(topology_map[socket_id]):
-            logicals = sorted(topology_map[socket_id][core_id])
-            core_used = any(cpu in used_cpus for cpu in logicals)
-            status = "❌" if core_used else "✅"
-            cpu_strs = []
-            for cpu in logicals:
-                marker = "*" if cpu in used_cpus else " "
-                cpu_strs.append(f"{cpu:3d}{marker}")
+def print_cpu_topology(cpu_topology: CpuInfo, used_cpus: AbstractSet[int]) -> None:
+    # The report is built in one buffer and written once, instead of one
+    # print() (and one write) per core.
+    buf: List[str] = [
+        "\n Host CPU Topology (Logical CPUs per Physical Core)\n",
+        " Status: ✅ = Core fully available | ❌ = Core partially/fully used | * = CPU assigned\n",
+        "-------------------------------------------------------------\n",
+    ]
+    append = buf.append
+
+    # A single sort of (socket, core, cpu) rows zipped from the topology
+    # columns lets us stream the groups in order.
+    topology = Topology.from_cpus(cpu_topology)
+    rows = sorted(zip(topology.socket_ids, topology.core_ids, topology.logical_ids))
+
+    for socket_id, socket_rows in groupby(rows, key=itemgetter(0)):
+        append(f"Socket {socket_id}:\n")
+        for core_id, core_rows in groupby(socket_rows, key=itemgetter(1)):
+            logicals = [row[2] for row in core_rows]
+            status = "✅" if used_cpus.isdisjoint(logicals) else "❌"
+            cpu_str = "][".join(
+                [f"{cpu:3d}{'*' if cpu in used_cpus else ' '}" for cpu in logicals]
+            )
+            append(f"  Core {core_id:3d}: [{cpu_str}] {status}\n")
+        append("\n")
 
-            cpu_str = "][".join(cpu_strs)
-            print(f"  Core {core_id:3d}: [{cpu_str}] {status}")
-        print()
+    sys.stdout.write("".join(buf))
 
 
 # ---------------------------------------------------------------------------
@@ -392,6 +1120,7 @@ def _positive_int(value: int, param_name: str) -> int:
     """Ensure *value* is strictly positive, otherwise exit with error."""
     if value <= 0:
         logging.error("%s must be a positive integer.", param_name)
+        sys.exit(1)
     return value
 
 
@@ -400,20 +1129,7 @@ def _positive_int(value: int, param_name: str) -> int:
 # ---------------------------------------------------------------------------
 
 
-def _build_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(
-        prog="pinvirt",
-        description=("Manage vCPU pinning for virtual machines.\n\n"),
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-    )
-
-    subparsers = parser.add_subparsers(
-        dest="command",
-        metavar="<command>",
-        help="Run 'pinvirt <command> --help' for details.",
-    )
-
-    # ---------------------------- add (automatic) --------------------------
+def _add_add_parser(subparsers: Any) -> None:
     add_parser = subparsers.add_parser(
         "add",
         help="Automatically pin a new VM.",
@@ -432,8 +1148,27 @@ def _build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Use both hyper‑threads of each core before moving to the next.",
     )
+    add_parser.add_argument(
+        "--ht-strategy",
+        choices=HT_STRATEGIES,
+        help="With --use-ht: fill each core's siblings first (sequential, "
+        "the default) or one thread per core first, then siblings (interleave).",
+    )
+    add_parser.add_argument(
+        "--numa-node",
+        type=int,
+        metavar="N",
+        help="Prefer cores of NUMA node N (e.g. where the VM memory lives).",
+    )
+    add_parser.add_argument(
+        "--pack-llc",
+        action="store_true",
+        help="Keep vCPUs within as few last-level caches (L3/CCX) and dies "
+        "as possible.",
+    )
 
-    # ------------------------- add‑manual (manual) -------------------------
+
+def _add_add_manual_parser(subparsers: Any) -> None:
     add_manual_parser = subparsers.add_parser(
         "add-manual", help="Manually pin a VM to a list of logical CPUs."
     )
@@ -443,17 +1178,58 @@ def _build_parser() -> argparse.ArgumentParser:
         help="Comma‑separated list of logical CPU IDs (e.g. '1,3,5,7').",
     )
 
-    # ------------------------------ remove ---------------------------------
+
+def _add_remove_parser(subparsers: Any) -> None:
     remove_parser = subparsers.add_parser(
         "remove", help="Remove a VM's pinning record."
     )
     remove_parser.add_argument("vm_name", help="Name of the VM.")
 
-    # ------------------------ simple information ---------------------------
-    subparsers.add_parser("list", help="List all pinned VMs.")
-    subparsers.add_parser("topology", help="Show host CPU topology.")
-    subparsers.add_parser("free-cpus", help="Show logical CPUs not assigned to any VM.")
-    subparsers.add_parser("help", help="Show this help message and exit.")
+
+def _add_simple_parser(command: str, help_text: str) -> Callable[[Any], None]:
+    return lambda subparsers: subparsers.add_parser(command, help=help_text)
+
+
+# Sub‑command name → function registering its sub‑parser, in help order.
+SUBPARSER_BUILDERS: Dict[str, Callable[[Any], None]] = {
+    "add": _add_add_parser,
+    "add-manual": _add_add_manual_parser,
+    "remove": _add_remove_parser,
+    "list": _add_simple_parser("list", "List all pinned VMs."),
+    "topology": _add_simple_parser("topology", "Show host CPU topology."),
+    "free-cpus": _add_simple_parser(
+        "free-cpus", "Show logical CPUs not assigned to any VM."
+    ),
+    "help": _add_simple_parser("help", "Show this help message and exit."),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _build_parser(command: Optional[str] = None) -> argparse.ArgumentParser:
+    """Builds the CLI parser (memoized per *command*).
+
+    When *command* names a known sub‑command only its sub‑parser is
+    registered, which is all that is needed to parse that invocation.
+    Otherwise (no command, ``help``, ``-h`` or a typo) the full parser is
+    built so that usage and error messages list every command.
+    """
+    parser = argparse.ArgumentParser(
+        prog="pinvirt",
+        description=("Manage vCPU pinning for virtual machines.\n\n"),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    subparsers = parser.add_subparsers(
+        dest="command",
+        metavar="<command>",
+        help="Run 'pinvirt <command> --help' for details.",
+    )
+
+    if command in SUBPARSER_BUILDERS and command != "help":
+        SUBPARSER_BUILDERS[command](subparsers)
+    else:
+        for add_subparser in SUBPARSER_BUILDERS.values():
+            add_subparser(subparsers)
 
     return parser
 
@@ -463,8 +1239,25 @@ def _build_parser() -> argparse.ArgumentParser:
 # ---------------------------------------------------------------------------
 
 
-def _handle_add(args: argparse.Namespace, pinning_data: "PinningMap") -> None:
+def _print_pinned(headline: str, assigned_cpus: List[int]) -> None:
+    """Prints the success banner of ``add`` / ``add-manual`` in one write."""
+    sys.stdout.write(
+        f"\n✅  {headline}\n"
+        f"   Assigned logical CPUs: {assigned_cpus}\n"
+        "------------------------------------------------\n"
+        "oVirt pinning string:\n"
+        f"{build_ovirt_pinning_string(assigned_cpus)}\n"
+        "------------------------------------------------\n\n"
+    )
+
+
+def _handle_add(
+    args: argparse.Namespace, pinning_data: "PinningMap", cpu_topology: CpuInfo
+) -> None:
     _positive_int(args.num_vcpus, "num_vcpus")
+    if args.ht_strategy is not None and not args.use_ht:
+        logging.error("--ht-strategy requires --use-ht.")
+        sys.exit(1)
 
     vm_name = args.vm_name
     if vm_name in pinning_data:
@@ -473,7 +1266,6 @@ def _handle_add(args: argparse.Namespace, pinning_data: "PinningMap") -> None:
         )
         sys.exit(1)
 
-    cpu_topology = get_cpu_topology()
     used_cpus = get_used_logical_cpus(pinning_data)
 
     assigned_cpus = generate_cpu_allocation(
@@ -483,25 +1275,27 @@ def _handle_add(args: argparse.Namespace, pinning_data: "PinningMap") -> None:
         target_socket=args.socket_id,
         allow_multi_socket=args.multi_socket,
         use_hyperthreads=args.use_ht,
+        pack_llc=args.pack_llc,
+        target_numa_node=args.numa_node,
+        ht_strategy=args.ht_strategy or "sequential",
+        numa_distances=get_numa_distances(),
     )
 
     pinning_data[vm_name] = assigned_cpus
     save_pinning(pinning_data)
 
     strategy_msg = "using hyper‑threads" if args.use_ht else "using one thread per core"
-    print(
-        "\n✅  Automatically pinned VM '{}' with {} vCPU(s) ({})".format(
+    _print_pinned(
+        "Automatically pinned VM '{}' with {} vCPU(s) ({})".format(
             vm_name, args.num_vcpus, strategy_msg
-        )
+        ),
+        assigned_cpus,
     )
-    print("   Assigned logical CPUs:", assigned_cpus)
-    print("------------------------------------------------")
-    print("oVirt pinning string:")
-    print(build_ovirt_pinning_string(assigned_cpus))
-    print("------------------------------------------------\n")
 
 
-def _handle_add_manual(args: argparse.Namespace, pinning_data: "PinningMap") -> None:
+def _handle_add_manual(
+    args: argparse.Namespace, pinning_data: "PinningMap", cpu_topology: CpuInfo
+) -> None:
     vm_name = args.vm_name
     if vm_name in pinning_data:
         logging.error(
@@ -509,11 +1303,19 @@ def _handle_add_manual(args: argparse.Namespace, pinning_data: "PinningMap") ->
         )
         sys.exit(1)
 
-    # Parse and validate the CPU list
+    # Parse and validate the CPU list in a single pass; the dict keeps the
+    # CPUs seen so far and doubles as the duplicate check.
+    seen: Dict[int, None] = {}
+    duplicates: List[int] = []
     try:
-        assigned_cpus = sorted(
-            int(cpu.strip()) for cpu in args.cpu_list.split(",") if cpu.strip()
-        )
+        for token in args.cpu_list.split(","):
+            token = token.strip()
+            if not token:
+                continue
+            cpu = int(token)
+            if cpu in seen:
+                duplicates.append(cpu)
+            seen[cpu] = None
     except ValueError:
         logging.error(
             "Invalid CPU list '%s'. Expected a comma-separated list of integers.",
@@ -521,21 +1323,22 @@ def _handle_add_manual(args: argparse.Namespace, pinning_data: "PinningMap") ->
         )
         sys.exit(1)
 
-    if not assigned_cpus:
+    if not seen:
         logging.error("CPU list cannot be empty.")
         sys.exit(1)
-    if len(assigned_cpus) != len(set(assigned_cpus)):
+    if duplicates:
         logging.error(
-            "Duplicate CPU IDs detected in the list: %s", assigned_cpus
+            "Duplicate CPU IDs detected in the list: %s", sorted(set(duplicates))
         )
         sys.exit(1)
 
-    cpu_topology = get_cpu_topology()
-    all_system_cpus = {cpu for cpu, _, _ in cpu_topology}
+    all_system_cpus = Topology.from_cpus(cpu_topology).cpu_set()
     used_cpus = get_used_logical_cpus(pinning_data)
 
-    invalid_cpus = {cpu for cpu in assigned_cpus if cpu not in all_system_cpus}
-    conflicting_cpus = {cpu for cpu in assigned_cpus if cpu in used_cpus}
+    assigned_cpus = sorted(seen)
+    assigned_set = seen.keys()
+    invalid_cpus = assigned_set - all_system_cpus
+    conflicting_cpus = assigned_set & used_cpus
 
     if invalid_cpus or conflicting_cpus:
         print("[ERROR] Cannot add VM pinning due to validation errors:")
@@ -549,12 +1352,7 @@ def _handle_add_manual(args: argparse.Namespace, pinning_data: "PinningMap") ->
     pinning_data[vm_name] = assigned_cpus
     save_pinning(pinning_data)
 
-    print(f"\n✅  Manually pinned VM '{vm_name}'")
-    print("   Assigned logical CPUs:", assigned_cpus)
-    print("------------------------------------------------")
-    print("oVirt pinning string:")
-    print(build_ovirt_pinning_string(assigned_cpus))
-    print("------------------------------------------------\n")
+    _print_pinned(f"Manually pinned VM '{vm_name}'", assigned_cpus)
 
 
 def _handle_remove(args: argparse.Namespace, pinning_data: "PinningMap") -> None:
@@ -562,15 +1360,16 @@ def _handle_remove(args: argparse.Namespace, pinning_data: "PinningMap") -> None
 
 
 def _handle_simple(
-    command: str, cpu_topology: "CpuInfo", pinning_data: "PinningMap"
+    command: str, cpu_topology: Optional[CpuInfo], pinning_data: "PinningMap"
 ) -> None:
-    used_cpus = get_used_logical_cpus(pinning_data)
-
+    # "list" only needs the pinning map; *cpu_topology* is None for it.
     if command == "list":
         list_vms(pinning_data)
     elif command == "free-cpus":
+        used_cpus = get_used_logical_cpus(pinning_data)
         list_available_cpus(cpu_topology, used_cpus)
     elif command == "topology":
+        used_cpus = get_used_logical_cpus(pinning_data)
         print_cpu_topology(cpu_topology, used_cpus)
     else:  # pragma: no cover – should never happen
         sys.exit(f"[BUG] Unhandled simple command: {command}")
@@ -583,34 +1382,42 @@ def _handle_simple(
 
 def pinvirt() -> None:
     argv = _normalize_legacy_command(sys.argv)
-    parser = _build_parser()
 
-    # No sub‑command provided → show usage and exit.
-    if len(argv) == 1:
-        parser.print_help(sys.stderr)
-        sys.exit(1)
+    if len(argv) == 2 and argv[1] in SIMPLE_COMMANDS:
+        # These take no arguments, so there is nothing for argparse to do.
+        args = argparse.Namespace(command=argv[1])
+    else:
+        parser = _build_parser(argv[1] if len(argv) > 1 else None)
 
-    # ``argparse`` <3.7 lacks required=True for sub‑parsers; manual check.
-    args = parser.parse_args(argv[1:])
-    if not getattr(args, "command", None):
-        parser.print_help(sys.stderr)
-        sys.exit(1)
+        # No sub‑command provided → show usage and exit.
+        if len(argv) == 1:
+            parser.print_help(sys.stderr)
+            sys.exit(1)
 
-    # The fake "help" sub‑command is kept solely for backward compatibility.
-    if args.command == "help":
-        parser.print_help()
-        return
+        # ``argparse`` <3.7 lacks required=True for sub‑parsers; manual check.
+        args = parser.parse_args(argv[1:])
+        if not getattr(args, "command", None):
+            parser.print_help(sys.stderr)
+            sys.exit(1)
+
+        # The fake "help" sub‑command is kept solely for backward compatibility.
+        if args.command == "help":
+            parser.print_help()
+            return
 
-    require_root()
+    # Read-only commands work for any user; only writes need root.
+    if args.command in MUTATING_COMMANDS:
+        require_root()
 
-    # Shared state loaded once per invocation
-    pinning_data = load_pinning()
-    cpu_topology = get_cpu_topology()
+    # The CPU topology is read once, and only for the commands that need it
+    # ("list" and "remove" never do); handlers receive it as an argument.
+    pinning_data = dict(load_pinning())
+    cpu_topology = get_cpu_topology() if args.command in TOPOLOGY_COMMANDS else None
 
     if args.command == "add":
-        _handle_add(args, pinning_data)
+        _handle_add(args, pinning_data, cpu_topology)
     elif args.command == "add-manual":
-        _handle_add_manual(args, pinning_data)
+        _handle_add_manual(args, pinning_data, cpu_topology)
     elif args.command == "remove":
         _handle_remove(args, pinning_data)
     else:
@@ -7,6 +7,8 @@ because they depend on root privileges, real `lscpu` output and stdout
 formatting that is better covered by integration tests.
 """
 
+import io
+import stat
 from typing import List
 
 import pytest
@@ -17,11 +19,14 @@ from pinvirt import (
     CpuAllocationError,
     Errno,
     LogicalCpu,
+    Topology,
+    _build_parser,
     _normalize_legacy_command,
     _positive_int,
     build_ovirt_pinning_string,
     generate_cpu_allocation,
     get_cpu_topology,
+    get_numa_distances,
     get_used_logical_cpus,
     load_pinning,
     remove_vm,
@@ -68,6 +73,62 @@ def pinning_file_tmp(tmp_path, monkeypatch):
     return tmp_file
 
 
+@pytest.fixture(autouse=True)
+def topology_cache_tmp(tmp_path, monkeypatch):
+    """
+    Redirect pinvirt.TOPOLOGY_CACHE_DIR and pinvirt.BOOT_ID_FILE so that
+    tests never read or write the real cache under /run/pinvirt. Returns
+    the cache file used for the fake boot id.
+    """
+    boot_id_file = tmp_path / "boot_id"
+    boot_id_file.write_text("boot-1\n")
+    cache_dir = tmp_path / "run_pinvirt"
+    monkeypatch.setattr(pinvirt, "BOOT_ID_FILE", str(boot_id_file))
+    monkeypatch.setattr(pinvirt, "TOPOLOGY_CACHE_DIR", str(cache_dir))
+    return cache_dir / "topology.boot-1.json"
+
+
+@pytest.fixture(autouse=True)
+def sysfs_cpu_tmp(tmp_path, monkeypatch):
+    """
+    Redirect pinvirt.SYSFS_CPU_DIR to an (initially missing) temporary
+    directory, so that tests fall back to the mocked `lscpu` by default.
+    """
+    sysfs_dir = tmp_path / "sys_cpu"
+    monkeypatch.setattr(pinvirt, "SYSFS_CPU_DIR", str(sysfs_dir))
+    monkeypatch.setattr(pinvirt, "SYSFS_NODE_DIR", str(tmp_path / "sys_node"))
+    return sysfs_dir
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Reset the per-process memoization of topology and pinning data."""
+    get_cpu_topology.cache_clear()
+    get_numa_distances.cache_clear()
+    pinvirt._clear_pinning_cache()
+    yield
+    get_cpu_topology.cache_clear()
+    get_numa_distances.cache_clear()
+    pinvirt._clear_pinning_cache()
+
+
+def make_sysfs_cpu(
+    sysfs_dir, logical_cpu, core_id, socket_id, llc_id=None, die_id=None
+):
+    """Create a fake ``cpuN/topology`` (and optional L3) entry under *sysfs_dir*."""
+    cpu_dir = sysfs_dir / "cpu{}".format(logical_cpu)
+    topo_dir = cpu_dir / "topology"
+    topo_dir.mkdir(parents=True)
+    (topo_dir / "core_id").write_text("{}\n".format(core_id))
+    (topo_dir / "physical_package_id").write_text("{}\n".format(socket_id))
+    if die_id is not None:
+        (topo_dir / "die_id").write_text("{}\n".format(die_id))
+    if llc_id is not None:
+        for index in ("index0", "index3"):
+            (cpu_dir / "cache" / index).mkdir(parents=True)
+        (cpu_dir / "cache" / "index3" / "id").write_text("{}\n".format(llc_id))
+
+
 # ---------------------------------------------------------------------------
 # generate_cpu_allocation
 # ---------------------------------------------------------------------------
@@ -104,6 +165,30 @@ def test_multi_socket_fallback(sample_topology):
     assert result == [2, 3]  # first physical cores on socket-1
 
 
+def test_multi_socket_fallback_nearest_socket_first():
+    # socket 2 (node 2) is closer to socket 0 than socket 1 is
+    cpus = [
+        LogicalCpu(s * 2 + c, c, s, numa_node=s) for s in range(3) for c in range(2)
+    ]
+    distances = {0: {0: 10, 1: 32, 2: 21}, 1: {0: 32, 1: 10, 2: 21}, 2: {2: 10}}
+    kwargs = dict(target_socket=0, allow_multi_socket=True)
+    assert generate_cpu_allocation(cpus, 3, {1}, **kwargs) == [0, 2, 3]
+    result = generate_cpu_allocation(cpus, 3, {1}, numa_distances=distances, **kwargs)
+    assert result == [0, 4, 5]
+    # socket 1's distance is unknown, so it must not look nearer than socket 2
+    partial = {0: {0: 10, 2: 21}}
+    result = generate_cpu_allocation(cpus, 3, {1}, numa_distances=partial, **kwargs)
+    assert result == [0, 4, 5]
+
+
+def test_get_numa_distances(sysfs_cpu_tmp):
+    node_root = sysfs_cpu_tmp.parent / "sys_node"
+    for node, row in ((0, "10 21"), (1, "21 10")):
+        (node_root / "node{}".format(node)).mkdir(parents=True)
+        (node_root / "node{}".format(node) / "distance").write_text(row + "\n")
+    assert get_numa_distances() == {0: {0: 10, 1: 21}, 1: {0: 21, 1: 10}}
+
+
 def test_hyperthread_strategy(sample_topology):
     """With use_hyperthreads=True the function must pack threads per core."""
     result = generate_cpu_allocation(
@@ -118,20 +203,162 @@ def test_hyperthread_strategy(sample_topology):
     assert result == [0, 1, 16]
 
 
+def test_hyperthread_interleave_strategy(sample_topology):
+    """Interleave takes one thread per core first, then the siblings."""
+    result = generate_cpu_allocation(
+        sample_topology,
+        2,
+        set(),
+        target_socket=0,
+        use_hyperthreads=True,
+        ht_strategy="interleave",
+    )
+    # Sequential would give [0, 16] (both threads of core(0,0))
+    assert result == [0, 1]
+
+
+def test_hyperthread_interleave_stays_on_target_socket(sample_topology):
+    """Interleaving must not spill onto socket 1 while socket 0 has room."""
+    result = generate_cpu_allocation(
+        sample_topology,
+        4,
+        set(),
+        target_socket=0,
+        allow_multi_socket=True,
+        use_hyperthreads=True,
+        ht_strategy="interleave",
+    )
+    assert result == [0, 1, 16, 17]
+    result = generate_cpu_allocation(
+        sample_topology,
+        5,
+        set(),
+        target_socket=0,
+        allow_multi_socket=True,
+        use_hyperthreads=True,
+        ht_strategy="interleave",
+    )
+    assert result == [0, 1, 2, 16, 17]
+
+
+def test_unknown_ht_strategy(sample_topology):
+    with pytest.raises(ValueError):
+        generate_cpu_allocation(
+            sample_topology, 2, set(), use_hyperthreads=True, ht_strategy="bogus"
+        )
+
+
+def test_ht_strategy_requires_use_ht(
+    monkeypatch, pinning_file_tmp, caplog, sample_topology
+):
+    monkeypatch.setattr(pinvirt, "get_cpu_topology", lambda: sample_topology)
+    monkeypatch.setattr(pinvirt.os, "geteuid", lambda: 0)
+    monkeypatch.setattr(
+        sys, "argv", ["pinvirt", "add", "vm1", "2", "0", "--ht-strategy", "interleave"]
+    )
+    with pytest.raises(SystemExit):
+        pinvirt.pinvirt()
+    assert "--ht-strategy requires --use-ht" in caplog.text
+
+
+def test_pack_llc_prefers_single_cache(sample_topology):
+    """Socket 0: core 0 on LLC 0, cores 1-2 on LLC 1; core 0 is free."""
+    topology = [
+        LogicalCpu(0, 0, 0, 0),
+        LogicalCpu(1, 1, 0, 1),
+        LogicalCpu(2, 2, 0, 1),
+        LogicalCpu(3, 3, 0, 0),
+    ]
+    used = {3}
+    plain = generate_cpu_allocation(topology, 2, used, target_socket=0)
+    packed = generate_cpu_allocation(
+        topology, 2, used, target_socket=0, pack_llc=True
+    )
+    assert plain == [0, 1]  # spans both caches
+    assert packed == [1, 2]  # fits entirely in LLC 1
+
+
+def test_pack_llc_keeps_vm_on_one_die():
+    """Die 0: LLC 0 = cores 4-5, LLC 1 = cores 6-7; die 1: LLC 2 = cores 0-2,
+    LLC 3 = cores 3 and 8. No single LLC holds 4 vCPUs."""
+    llc_die = {0: (2, 1), 1: (2, 1), 2: (2, 1), 3: (3, 1), 8: (3, 1)}
+    llc_die.update({4: (0, 0), 5: (0, 0), 6: (1, 0), 7: (1, 0)})
+    topology = [
+        LogicalCpu(cpu, cpu, 0, llc, 0, die) for cpu, (llc, die) in llc_die.items()
+    ]
+    result = generate_cpu_allocation(topology, 4, set(), pack_llc=True)
+    # Largest-LLC-first alone would take [0, 1, 2, 4] and cross dies.
+    assert result == [4, 5, 6, 7]
+
+
+def test_numa_node_preferred_within_socket():
+    """Socket 0 is split in two NUMA nodes: cores 0-1 (node 0), 2-3 (node 1)."""
+    topology = [
+        LogicalCpu(cpu, cpu, 0, 0, 0 if cpu < 2 else 1) for cpu in range(4)
+    ]
+    result = generate_cpu_allocation(
+        topology, 2, {2}, target_socket=0, target_numa_node=1
+    )
+    assert result == [0, 3]  # node 1 first (core 3), then the rest of socket 0
+
+
+def test_invalid_numa_node(sample_topology):
+    with pytest.raises(CpuAllocationError) as exc:
+        generate_cpu_allocation(sample_topology, 1, set(), target_numa_node=5)
+    assert exc.value.args[0] is Errno.NO_NUMA_NODE
+
+
+def test_numa_node_on_other_socket(sample_topology):
+    topology = [cpu._replace(numa_node=cpu.socket_id) for cpu in sample_topology]
+    with pytest.raises(CpuAllocationError) as exc:
+        generate_cpu_allocation(topology, 2, set(), target_socket=0, target_numa_node=1)
+    assert exc.value.args[0] is Errno.NO_NUMA_NODE
+    result = generate_cpu_allocation(
+        topology, 2, set(), target_socket=0, allow_multi_socket=True, target_numa_node=1
+    )
+    assert result == [2, 3]
+
+
 def test_invalid_socket_id(sample_topology):
     with pytest.raises(CpuAllocationError) as exc:
         generate_cpu_allocation(sample_topology, 1, set(), target_socket=99)
     assert exc.value.args[0] is Errno.NO_SOCKET
 
 
+# ---------------------------------------------------------------------------
+# Topology
+# ---------------------------------------------------------------------------
+
+
+def test_topology_round_trip(sample_topology):
+    topology = Topology.from_cpus(sample_topology)
+    assert len(topology) == len(sample_topology)
+    assert list(topology) == sample_topology
+    assert topology[2] == LogicalCpu(1, 1, 0)
+    assert list(topology.socket_ids) == [0, 0, 0, 0, 1, 1, 1, 1]
+    assert Topology.from_cpus(topology) is topology
+    assert topology.cpu_set() == {0, 1, 2, 3, 16, 17, 18, 19}
+    assert topology.cpu_set() is topology.cpu_set()
+
+
+def test_allocation_accepts_topology(sample_topology):
+    result = generate_cpu_allocation(
+        Topology.from_cpus(sample_topology), 2, {0}, target_socket=0
+    )
+    assert result == [1, 16]
+
+
 # ---------------------------------------------------------------------------
 # build_ovirt_pinning_string
 # ---------------------------------------------------------------------------
 
 
 def test_build_ovirt_pinning_string():
-    cpus = [7, 3, 1]
+    cpus = [1, 3, 7]
     assert build_ovirt_pinning_string(cpus) == "0#1_1#3_2#7"
+    hits = pinvirt._ovirt_string.cache_info().hits
+    assert build_ovirt_pinning_string((1, 3, 7)) == "0#1_1#3_2#7"
+    assert pinvirt._ovirt_string.cache_info().hits == hits + 1
 
 
 # ---------------------------------------------------------------------------
@@ -142,43 +369,166 @@ def test_build_ovirt_pinning_string():
 def test_get_used_logical_cpus():
     mapping = {"vmA": [0, 1], "vmB": [4, 5]}
     assert get_used_logical_cpus(mapping) == {0, 1, 4, 5}
+    assert isinstance(get_used_logical_cpus(mapping), frozenset)
 
 
 # ---------------------------------------------------------------------------
 # get_cpu_topology – subprocess mocked
 # ---------------------------------------------------------------------------
 
-LSCPU_FAKE_OUTPUT = """\
+LSCPU_FAKE_OUTPUT = b"""\
 # comment line ignored
-0,0,0
-16,0,0
-1,1,0
-17,1,0
+0,0,0,0,0:0:0:0
+16,0,0,0,0:0:0:0
+1,1,0,1,1:1:1:1
+17,1,0,1,1:1:1:1
+invalid,line,ignored,,
 """
 
 
+def fake_lscpu(monkeypatch, output, returncode=0):
+    """Replace ``subprocess.Popen`` with a fake streaming *output* (bytes)."""
+
+    class FakePopen:
+        def __init__(self, *_a, **_kw):
+            self.stdout = io.BytesIO(output)
+            self.returncode = returncode
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *_exc):
+            return False
+
+    monkeypatch.setattr(pinvirt.subprocess, "Popen", FakePopen)
+
+
 def test_get_cpu_topology_success(monkeypatch):
-    monkeypatch.setattr(
-        pinvirt.subprocess, "check_output", lambda *_, **__: LSCPU_FAKE_OUTPUT
-    )
+    fake_lscpu(monkeypatch, LSCPU_FAKE_OUTPUT)
     topo = get_cpu_topology()
-    assert topo == [
-        LogicalCpu(0, 0, 0),
-        LogicalCpu(16, 0, 0),
-        LogicalCpu(1, 1, 0),
-        LogicalCpu(17, 1, 0),
+    assert list(topo) == [
+        LogicalCpu(0, 0, 0, 0, 0),
+        LogicalCpu(16, 0, 0, 0, 0),
+        LogicalCpu(1, 1, 0, 1, 1),
+        LogicalCpu(17, 1, 0, 1, 1),
     ]
 
 
+def test_get_cpu_topology_lscpu_cache_per_column(monkeypatch):
+    """Newer util-linux prints one CSV column per cache level."""
+    fake_lscpu(monkeypatch, b"3,1,0,1,,3,3,1,2\n")
+    assert list(get_cpu_topology()) == [LogicalCpu(3, 1, 0, 2, 1)]
+
+
+def test_get_cpu_topology_lscpu_without_cache_column(monkeypatch):
+    fake_lscpu(monkeypatch, b"0,0,1,,\n")
+    assert list(get_cpu_topology()) == [LogicalCpu(0, 0, 1, 1, 0)]
+
+
+def test_get_cpu_topology_lscpu_duplicate_rows(monkeypatch):
+    fake_lscpu(monkeypatch, b"0,0,0,,\n1,1,0,,\n0,0,0,,\n")
+    assert [cpu.logical_id for cpu in get_cpu_topology()] == [0, 1]
+
+
 def test_get_cpu_topology_command_not_found(monkeypatch):
     def raise_fn(*_a, **_kw):
         raise FileNotFoundError
 
-    monkeypatch.setattr(pinvirt.subprocess, "check_output", raise_fn)
+    monkeypatch.setattr(pinvirt.subprocess, "Popen", raise_fn)
+    with pytest.raises(SystemExit):
+        get_cpu_topology()
+
+
+def test_get_cpu_topology_lscpu_failure(monkeypatch):
+    fake_lscpu(monkeypatch, LSCPU_FAKE_OUTPUT, returncode=1)
     with pytest.raises(SystemExit):
         get_cpu_topology()
 
 
+def test_get_cpu_topology_sysfs(monkeypatch, sysfs_cpu_tmp):
+    for logical_cpu, core_id, socket_id in [(16, 0, 0), (0, 0, 0), (1, 1, 0)]:
+        make_sysfs_cpu(sysfs_cpu_tmp, logical_cpu, core_id, socket_id, llc_id=7)
+    (sysfs_cpu_tmp / "cpu17").mkdir()  # offline CPU: no topology directory
+    node_dir = sysfs_cpu_tmp.parent / "sys_node" / "node1"
+    node_dir.mkdir(parents=True)
+    (node_dir / "cpulist").write_text("0-1,16\n")
+    (sysfs_cpu_tmp / "cpufreq").mkdir()
+
+    def raise_fn(*_a, **_kw):
+        raise AssertionError("lscpu must not run when sysfs is available")
+
+    monkeypatch.setattr(pinvirt.subprocess, "Popen", raise_fn)
+    assert list(get_cpu_topology()) == [
+        LogicalCpu(0, 0, 0, 7, 1),
+        LogicalCpu(1, 1, 0, 7, 1),
+        LogicalCpu(16, 0, 0, 7, 1),
+    ]
+
+
+def test_get_cpu_topology_sysfs_die_id(sysfs_cpu_tmp):
+    make_sysfs_cpu(sysfs_cpu_tmp, 0, 0, 0, die_id=0)
+    make_sysfs_cpu(sysfs_cpu_tmp, 1, 8, 0, die_id=1)
+    assert [cpu.die_id for cpu in get_cpu_topology()] == [0, 1]
+
+
+def test_get_cpu_topology_sysfs_online_list(sysfs_cpu_tmp):
+    for logical_cpu in range(4):
+        make_sysfs_cpu(sysfs_cpu_tmp, logical_cpu, logical_cpu, 0)
+    (sysfs_cpu_tmp / "online").write_text("0,2-3\n")
+    assert [cpu.logical_id for cpu in get_cpu_topology()] == [0, 2, 3]
+
+
+def test_get_cpu_topology_uses_cache(monkeypatch):
+    fake_lscpu(monkeypatch, LSCPU_FAKE_OUTPUT)
+    first = get_cpu_topology()
+    get_cpu_topology.cache_clear()  # force a read of the on-disk cache
+
+    def raise_fn(*_a, **_kw):
+        raise AssertionError("lscpu must not run on a cache hit")
+
+    monkeypatch.setattr(pinvirt.subprocess, "Popen", raise_fn)
+    assert list(get_cpu_topology()) == list(first)
+
+
+def test_get_cpu_topology_stale_cache(monkeypatch, topology_cache_tmp):
+    topology_cache_tmp.parent.mkdir()
+    topology_cache_tmp.write_text('{"version": -1, "topology": [[9, 9, 9, 9, 9]]}')
+    fake_lscpu(monkeypatch, LSCPU_FAKE_OUTPUT)
+    assert LogicalCpu(9, 9, 9, 9, 9) not in get_cpu_topology()
+
+
+def test_get_cpu_topology_cache_is_per_boot(monkeypatch, tmp_path, topology_cache_tmp):
+    fake_lscpu(monkeypatch, LSCPU_FAKE_OUTPUT)
+    get_cpu_topology()
+    assert topology_cache_tmp.exists()
+
+    get_cpu_topology.cache_clear()
+    (tmp_path / "boot_id").write_text("boot-2\n")
+    get_cpu_topology()
+    assert (topology_cache_tmp.parent / "topology.boot-2.json").exists()
+
+
+def test_get_cpu_topology_cache_invalidated_by_hotplug(
+    sysfs_cpu_tmp, topology_cache_tmp
+):
+    for logical_cpu in range(4):
+        make_sysfs_cpu(sysfs_cpu_tmp, logical_cpu, logical_cpu, 0)
+    (sysfs_cpu_tmp / "online").write_text("0-3\n")
+    assert len(get_cpu_topology()) == 4
+    assert topology_cache_tmp.exists()
+
+    get_cpu_topology.cache_clear()
+    (sysfs_cpu_tmp / "online").write_text("0-2\n")  # CPU 3 taken offline
+    assert [cpu.logical_id for cpu in get_cpu_topology()] == [0, 1, 2]
+
+
+def test_get_cpu_topology_unwritable_cache_dir(monkeypatch, tmp_path):
+    (tmp_path / "not_a_dir").write_text("")
+    monkeypatch.setattr(pinvirt, "TOPOLOGY_CACHE_DIR", str(tmp_path / "not_a_dir"))
+    fake_lscpu(monkeypatch, LSCPU_FAKE_OUTPUT)
+    assert len(get_cpu_topology()) == 4
+
+
 # ---------------------------------------------------------------------------
 # load_pinning / save_pinning
 # ---------------------------------------------------------------------------
@@ -191,6 +541,110 @@ def test_load_and_save_pinning(pinning_file_tmp):
     assert data_out == data_in
 
 
+def test_load_and_save_pinning_stdlib_json(pinning_file_tmp, monkeypatch):
+    monkeypatch.setattr(pinvirt, "orjson", None)
+    monkeypatch.setattr(pinvirt, "_import_orjson", lambda: None)
+    data_in = {"vm{:04d}".format(i): [i] for i in range(500)}
+    save_pinning(data_in)
+    assert load_pinning() == data_in
+
+
+def test_small_pinning_file_skips_orjson(pinning_file_tmp, monkeypatch):
+    monkeypatch.setattr(pinvirt, "orjson", None)
+    save_pinning({"vmX": [1, 2, 3]})
+    assert load_pinning() == {"vmX": [1, 2, 3]}
+    assert pinvirt.orjson is None  # not imported for a small map
+
+
+def test_save_pinning_output_is_backend_independent(pinning_file_tmp, monkeypatch):
+    pytest.importorskip("orjson")
+    assert pinvirt._import_orjson() is not None
+    data_in = {"vmB": [3], "vmA": [2, 1]}
+    save_pinning(data_in)
+    with_orjson = pinning_file_tmp.read_bytes()
+
+    monkeypatch.setattr(pinvirt, "orjson", None)
+    save_pinning(data_in)
+    assert pinning_file_tmp.read_bytes() == with_orjson
+    assert with_orjson.index(b'"vmA"') < with_orjson.index(b'"vmB"')
+
+
+def test_load_pinning_large_file_via_mmap(pinning_file_tmp):
+    pytest.importorskip("orjson")
+    data_in = {"vm{:04d}".format(i): [i] for i in range(500)}
+    save_pinning(data_in)
+    assert pinning_file_tmp.stat().st_size > pinvirt._MMAP_MIN_SIZE
+    pinvirt._clear_pinning_cache()
+    assert load_pinning() == data_in
+
+
+def test_load_pinning_empty_file(pinning_file_tmp, caplog):
+    pinning_file_tmp.write_bytes(b"")
+    assert load_pinning() == {}
+    assert not caplog.records
+
+
+def test_load_pinning_invalid_json(pinning_file_tmp):
+    pinning_file_tmp.write_text("{not json")
+    assert load_pinning() == {}
+
+
+def test_load_pinning_json_not_an_object(pinning_file_tmp, caplog):
+    for content in ("[]", "null"):
+        caplog.clear()
+        pinning_file_tmp.write_text(content)
+        assert load_pinning() == {}
+        assert "Invalid JSON format" in caplog.text
+
+
+def test_save_pinning_keeps_old_file_on_failure(pinning_file_tmp, monkeypatch):
+    save_pinning({"vmX": [1]})
+
+    def fail_replace(*_a, **_kw):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pinvirt.os, "replace", fail_replace)
+    with pytest.raises(SystemExit):
+        save_pinning({"vmX": [1], "vmY": [2]})
+
+    pinvirt._clear_pinning_cache()
+    assert load_pinning() == {"vmX": [1]}
+    leftovers = [p.name for p in pinning_file_tmp.parent.glob("*pinning.json*")]
+    assert leftovers == ["pinning.json"]
+
+
+def test_save_pinning_sorts_and_dedups(pinning_file_tmp):
+    save_pinning({"vmX": [5, 1, 3, 1]})
+    assert load_pinning() == {"vmX": [1, 3, 5]}
+
+
+def test_save_pinning_file_mode(pinning_file_tmp):
+    save_pinning({"vmX": [1]})
+    assert stat.S_IMODE(pinning_file_tmp.stat().st_mode) == 0o644
+    pinning_file_tmp.chmod(0o600)
+    save_pinning({"vmX": [2]})
+    assert stat.S_IMODE(pinning_file_tmp.stat().st_mode) == 0o600
+
+
+def test_load_pinning_is_memoized_and_read_only(pinning_file_tmp):
+    save_pinning({"vmX": [1]})
+    first = load_pinning()
+    assert load_pinning() is first
+    with pytest.raises(TypeError):
+        first["vmY"] = [2]
+
+    save_pinning({"vmX": [1], "vmY": [2]})
+    assert load_pinning() == {"vmX": [1], "vmY": [2]}
+
+
+def test_load_pinning_sees_external_changes(pinning_file_tmp):
+    save_pinning({"vmX": [1]})
+    assert load_pinning() == {"vmX": [1]}
+    pinning_file_tmp.unlink()  # another process replaces the file
+    pinning_file_tmp.write_text('{"vmY": [2]}')
+    assert load_pinning() == {"vmY": [2]}
+
+
 def test_load_pinning_missing_file(tmp_path, monkeypatch):
     monkeypatch.setattr(pinvirt, "PINNING_FILE", str(tmp_path / "missing.json"))
     assert load_pinning() == {}
@@ -206,10 +660,24 @@ def test_normalize_legacy_command():
     assert _normalize_legacy_command(argv) == ["pinvirt", "add", "vm1", "2", "0"]
 
 
+def test_build_parser_for_single_command():
+    argv = ["add", "vm1", "2", "0", "--use-ht"]
+    lazy = _build_parser("add").parse_args(argv)
+    assert lazy == _build_parser().parse_args(argv)
+    with pytest.raises(SystemExit):
+        _build_parser("add").parse_args(["list"])
+
+
 def test_positive_int_pass():
     assert _positive_int(10, "arg") == 10
 
 
+def test_positive_int_fail():
+    # the module-level helper below shadows the imported name
+    with pytest.raises(SystemExit):
+        pinvirt._positive_int(-1, "num_vcpus")
+
+
 def _positive_int(value: int, param_name: str) -> int:
     """Ensure *value* is strictly positive, otherwise exit with error."""
     if value <= 0:
@@ -217,6 +685,23 @@ def _positive_int(value: int, param_name: str) -> int:
     return value
 
 
+def test_list_and_remove_skip_topology(monkeypatch, pinning_file_tmp, capsys):
+    def raise_fn():
+        raise AssertionError("list/remove must not read the CPU topology")
+
+    monkeypatch.setattr(pinvirt, "get_cpu_topology", raise_fn)
+    monkeypatch.setattr(pinvirt.os, "geteuid", lambda: 0)
+    save_pinning({"vm1": [0, 1]})
+
+    monkeypatch.setattr(sys, "argv", ["pinvirt", "list"])
+    pinvirt.pinvirt()
+    assert "vm1" in capsys.readouterr().out
+
+    monkeypatch.setattr(sys, "argv", ["pinvirt", "remove", "vm1"])
+    pinvirt.pinvirt()
+    assert load_pinning() == {}
+
+
 def test_require_root_pass(monkeypatch):
     monkeypatch.setattr(pinvirt.os, "geteuid", lambda: 0)
     require_root()  # should *not* raise
@@ -228,6 +713,17 @@ def test_require_root_fail(monkeypatch):
         require_root()
 
 
+# ---------------------------------------------------------------------------
+# list_available_cpus
+# ---------------------------------------------------------------------------
+
+
+def test_list_available_cpus(sample_topology, capsys):
+    pinvirt.list_available_cpus(sample_topology, {0, 16, 2})
+    out, _ = capsys.readouterr()
+    assert "[1, 3, 17, 18, 19]" in out
+
+
 # ---------------------------------------------------------------------------
 # remove_vm
 # ---------------------------------------------------------------------------